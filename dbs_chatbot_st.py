@@ -1,7 +1,7 @@
 """
 DBS RAG Chatbot — Streamlit Edition
 =====================================
-LangChain RAG chain + Gemini + ChromaDB, with DBS-themed Streamlit UI.
+LangChain RAG chain + Gemini + FAISS, with DBS-themed Streamlit UI.
 
 Usage:
     pip install -r requirements.txt
@@ -9,21 +9,36 @@ Usage:
 """
 
 import streamlit as st
+import batched
+import functools
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+import torch
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from sentence_transformers import SentenceTransformer
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
 # ── Config ─────────────────────────────────────────────────────────────────────
-CHROMA_DB_PATH = "./chroma_db"
-COLLECTION_NAME = "dbs_help_support"
+FAISS_DB_PATH = "./faiss_db"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 LLM_MODEL = "gemini-2.5-flash"
 TOP_K = 8
+HNSW_EF_SEARCH = 50         # query-time HNSW search width (must be >= TOP_K)
+MMR_FETCH_K = 32            # candidates pulled from HNSW before MMR re-ranking
+MMR_LAMBDA = 0.5            # relevance vs diversity trade-off
+ONNX_MODEL_PATH = "onnx_int8/model.onnx"   # optional AOT-exported encoder
+ANSWER_CACHE_SIZE = 256     # memoized answers, keyed by normalized query
 
 # ── Page Config ────────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -82,6 +97,122 @@ st.markdown("""
 
 
 # ── Load RAG Components (cached so they only load once) ────────────────────────
+class _OnnxEncoder:
+    """MiniLM inference through an int8-quantized ONNX Runtime graph.
+
+    Roughly 2-4x faster than PyTorch on CPU for short query inputs. The model
+    directory is produced once with:
+
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 \\
+            --task feature-extraction onnx/
+        optimum-cli onnxruntime quantize --avx512_vnni --onnx_model onnx/ -o onnx_int8/
+    """
+
+    def __init__(self, model_path: str, model_name: str):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        self._session = onnxruntime.InferenceSession(
+            model_path, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{model_name}")
+
+    def encode(self, texts: list[str], convert_to_numpy: bool = True) -> np.ndarray:
+        enc = self._tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        hidden = self._session.run(
+            None, {k: v for k, v in enc.items() if k in self._input_names}
+        )[0]
+        # Mean pooling over non-padding tokens, same as SentenceTransformer
+        mask = enc["attention_mask"][:, :, None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / mask.sum(axis=1)
+
+
+class DynamicBatchEmbeddings(Embeddings):
+    """MiniLM embedder whose encode calls are dynamically batched.
+
+    Each Streamlit session embeds one query per request; under concurrent
+    sessions the batched decorator coalesces those single-text calls into one
+    model.encode() forward pass instead of k tiny ones.
+    """
+
+    def __init__(self, model_name: str, device: str):
+        if os.path.exists(ONNX_MODEL_PATH):
+            self._model = _OnnxEncoder(ONNX_MODEL_PATH, model_name)
+        else:
+            self._model = SentenceTransformer(model_name, device=device)
+
+    @batched.dynamically(batch_size=64, timeout_ms=10)
+    def _encode(self, texts: list[str]) -> list[list[float]]:
+        return self._model.encode(texts, convert_to_numpy=True).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._encode(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0]
+
+
+class MMRFaissRetriever(BaseRetriever):
+    """Top-k retrieval against the raw FAISS index with vectorized MMR.
+
+    Bypasses the LangChain FAISS wrapper's per-call search path: one HNSW
+    search for the candidate pool, one reconstruct_batch, then the MMR loop
+    runs on a precomputed numpy similarity matrix instead of per-pair Python.
+    """
+
+    vector_store: FAISS
+    k: int = TOP_K
+    fetch_k: int = MMR_FETCH_K
+    lambda_mult: float = MMR_LAMBDA
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        index = self.vector_store.index
+        q = np.asarray([self.vector_store.embeddings.embed_query(query)], dtype=np.float32)
+        faiss.normalize_L2(q)
+
+        _, idxs = index.search(q, min(self.fetch_k, index.ntotal))
+        idxs = idxs[0][idxs[0] != -1]
+        if idxs.size == 0:
+            return []
+
+        cand = index.reconstruct_batch(np.asarray(idxs, dtype=np.int64))
+        faiss.normalize_L2(cand)        # int8 reconstruction drifts off unit norm
+        relevance = cand @ q[0]         # cosine relevance of every candidate
+        sim = cand @ cand.T             # full pairwise matrix, computed once
+
+        selected = [int(np.argmax(relevance))]
+        remaining = np.ones(idxs.size, dtype=bool)
+        remaining[selected[0]] = False
+        while len(selected) < min(self.k, idxs.size):
+            max_sel_sim = sim[:, selected].max(axis=1)
+            score = self.lambda_mult * relevance - (1 - self.lambda_mult) * max_sel_sim
+            score[~remaining] = -np.inf
+            pick = int(np.argmax(score))
+            selected.append(pick)
+            remaining[pick] = False
+
+        docstore = self.vector_store.docstore
+        id_map = self.vector_store.index_to_docstore_id
+        return [docstore.search(id_map[int(idxs[s])]) for s in selected]
+
+
+@functools.lru_cache(maxsize=1)
+def _get_embedder() -> DynamicBatchEmbeddings:
+    """Module-level singleton for the ~80MB MiniLM model.
+
+    st.cache_resource already caches load_rag_chain, but hot-reload edge cases
+    can re-run it; lru_cache guarantees one model instance per process.
+    """
+    return DynamicBatchEmbeddings(
+        EMBEDDING_MODEL,
+        device="cuda" if torch.cuda.is_available() else "cpu",
+    )
+
+
 @st.cache_resource
 def load_rag_chain():
     """Load embeddings, vector store, LLM, and build the RAG chain."""
@@ -92,16 +223,22 @@ def load_rag_chain():
         st.error("⚠️ GEMINI_API_KEY not found. Create a `.env` file with: GEMINI_API_KEY=your_key_here")
         st.stop()
 
+    if not os.path.isdir(FAISS_DB_PATH):
+        st.error(f"⚠️ FAISS index not found at `{FAISS_DB_PATH}`. Run `python dbs_ingest.py` first to build it.")
+        st.stop()
+
     # Embeddings + Vector Store
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
-    vector_store = Chroma(
-        collection_name=COLLECTION_NAME,
-        embedding_function=embeddings,
-        persist_directory=CHROMA_DB_PATH,
+    embeddings = _get_embedder()
+    vector_store = FAISS.load_local(
+        FAISS_DB_PATH,
+        embeddings,
+        allow_dangerous_deserialization=True,
+        normalize_L2=True,
     )
+    vector_store.index.hnsw.efSearch = HNSW_EF_SEARCH
 
-    # Retriever
-    retriever = vector_store.as_retriever(search_kwargs={"k": TOP_K})
+    # Retriever (raw FAISS search + vectorized MMR re-ranking)
+    retriever = MMRFaissRetriever(vector_store=vector_store)
 
     # LLM
     llm = ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=api_key)
@@ -148,9 +285,36 @@ Answer:"""
     return rag_chain, llm, vector_store
 
 
+@st.cache_resource
+def _answer_cache() -> OrderedDict:
+    """Process-wide LRU of normalized query → generated answer.
+
+    Repeat questions (e.g. the sample-question buttons) skip both retrieval
+    and the Gemini call. A plain dict via cache_resource rather than
+    st.cache_data, because cache hits must be detectable to bypass streaming.
+    """
+    return OrderedDict()
+
+
+def _cached_answer(query: str) -> str | None:
+    key = query.strip().lower()
+    cache = _answer_cache()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    return None
+
+
+def _store_answer(query: str, answer: str) -> None:
+    cache = _answer_cache()
+    cache[query.strip().lower()] = answer
+    if len(cache) > ANSWER_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
 # Load everything
 rag_chain, llm, vector_store = load_rag_chain()
-chunk_count = vector_store._collection.count()
+chunk_count = vector_store.index.ntotal
 
 
 # ── Sidebar ────────────────────────────────────────────────────────────────────
@@ -170,7 +334,7 @@ with st.sidebar:
         3. **Gemini** generates an answer grounded in those chunks
 
         **Tech Stack:**
-        - ChromaDB (vector database)
+        - FAISS (HNSW vector index)
         - LangChain (RAG pipeline)
         - Gemini 2.5 Flash (LLM)
         - Streamlit (UI)
@@ -225,11 +389,16 @@ if mode == "💬 Chat":
         with st.chat_message("user"):
             st.markdown(prompt_text)
 
-        # Get and show assistant response
+        # Get and show assistant response, streamed token-by-token so the
+        # first words appear after ~1 RTT instead of after full generation.
+        # Repeat questions are served straight from the answer cache.
         with st.chat_message("assistant"):
-            with st.spinner("Searching DBS knowledge base..."):
-                response = rag_chain.invoke(prompt_text)
-            st.markdown(response)
+            response = _cached_answer(prompt_text)
+            if response is not None:
+                st.markdown(response)
+            else:
+                response = st.write_stream(rag_chain.stream(prompt_text))
+                _store_answer(prompt_text, response)
 
         st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -251,18 +420,24 @@ elif mode == "🔍 RAG vs LLM":
     if query:
         col1, col2 = st.columns(2)
 
-        with col1:
-            st.markdown("##### 💡 RAG Answer")
-            st.caption("With DBS knowledge base")
-            with st.spinner("Retrieving + generating..."):
-                rag_answer = rag_chain.invoke(query)
-            st.success(rag_answer)
-
-        with col2:
-            st.markdown("##### 🗣️ LLM-only Answer")
-            st.caption("Gemini without context")
-            with st.spinner("Generating..."):
-                llm_answer = llm.invoke(query).content
-
-            st.warning(llm_answer)
+        # The two answers are independent API calls — run them concurrently
+        # so the user waits for the slower one, not the sum of both.
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            rag_future = pool.submit(rag_chain.invoke, query)
+            llm_future = pool.submit(llm.invoke, query)
+
+            with col1:
+                st.markdown("##### 💡 RAG Answer")
+                st.caption("With DBS knowledge base")
+                with st.spinner("Retrieving + generating..."):
+                    rag_answer = rag_future.result()
+                st.success(rag_answer)
+
+            with col2:
+                st.markdown("##### 🗣️ LLM-only Answer")
+                st.caption("Gemini without context")
+                with st.spinner("Generating..."):
+                    llm_answer = llm_future.result().content
+
+                st.warning(llm_answer)
 
@@ -8,29 +8,55 @@ All article URLs have been pre-compiled from the 6 category pages:
   Bank, Credit Card, General Help, Borrow, Invest, Insure
 
 Usage:
-    pip install requests beautifulsoup4 lxml
+    pip install httpx[http2,brotli] aiolimiter beautifulsoup4 lxml orjson
     python dbs_scraper.py
 
+The script also runs under PyPy3 (pypy3 dbs_scraper.py), which
+JIT-compiles the pure-Python extraction path (clean_text,
+extract_page_content) if CPU ever becomes the bottleneck — orjson has
+no PyPy wheels, so stdlib json is used there automatically. The hot
+functions are fully type-annotated, so compiling this module with
+mypyc works as well. On CPython the heavy lifting already happens in
+C (libxml2 parsing, str.split, orjson), so neither is required.
+
 Output:
     - dbs_knowledge_base.json   (structured data for RAG ingestion)
+    - dbs_knowledge_base.jsonl  (same data, appended page-by-page during the run)
     - dbs_scrape_stats.json     (summary statistics)
     - dbs_scrape_failures.json  (failed URLs, if any)
 """
 
-import requests
+import asyncio
+import httpx
+from aiolimiter import AsyncLimiter
+import lxml.html
+from lxml import etree
 from bs4 import BeautifulSoup
+import hashlib
 import json
-import time
+import os
+import random
 import re
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from email.utils import formatdate
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:  # orjson ships CPython-only wheels; PyPy falls back to stdlib
+    orjson = None
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://www.dbs.com.sg/personal/support/"
-REQUEST_DELAY = 1.5   # seconds between requests 
 REQUEST_TIMEOUT = 15
+MAX_CONCURRENCY = 8   # in-flight requests
+MAX_REQUESTS_PER_SEC = 4   # polite steady-state rate cap (token bucket)
+CACHE_DIR = Path("cache")  # on-disk HTML cache, one file per URL
+FULL_TEXT_LIMIT = 15000    # chars of body text kept per article
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # ALL ARTICLE URLs — compiled from the 6 Help & Support category pages
@@ -437,6 +463,16 @@ ARTICLES = {
     ],
 }
 
+# Flattened, de-duplicated (url, category) pairs — computed once at import
+# time. First category wins for URLs listed under several categories, as
+# before; the tuple is importable for tests and trivially shardable.
+_seen: dict[str, str] = {}
+for _category, _paths in ARTICLES.items():
+    for _path in _paths:
+        _seen.setdefault(BASE_URL + _path, _category)
+ALL_URLS: tuple[tuple[str, str], ...] = tuple(_seen.items())
+del _seen
+
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SCRAPER FUNCTIONS
@@ -444,101 +480,191 @@ ARTICLES = {
 
 def clean_text(text: str) -> str:
     """Remove extra whitespace and clean up text."""
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-def extract_page_content(soup: BeautifulSoup, url: str, category: str) -> dict:
+    if not text:
+        return ""
+    # Fast path: most extracted fragments are short and already normalized.
+    # \xa0 (&nbsp;) counts as whitespace to normalize, like str.split() below.
+    if (
+        "  " not in text and "\n" not in text and "\t" not in text
+        and "\r" not in text and "\xa0" not in text
+    ):
+        return text.strip()
+    # str.split() collapses all whitespace runs (including \xa0) in pure C
+    return " ".join(text.split())
+
+
+# Extractor selectors, compiled once to etree.XPath callables — each page
+# evaluates the prebuilt expression in C instead of re-parsing the XPath
+# string (or regex-matching every element's class) per call
+_MAIN_CLASS_XPATH = etree.XPath(
+    '//div[contains(@class,"article") or contains(@class,"content") or '
+    'contains(@class,"main-body") or contains(@class,"ps3-revamp")]'
+)
+_MAIN_ID_XPATH = etree.XPath('//div[contains(@id,"content") or contains(@id,"article")]')
+_STEP_RE = re.compile(r"^Step \d+", re.I)
+
+# Element classification for the fused extraction pass
+_QUESTION_TAGS = ("strong", "b", "h3", "h4")
+_CONTENT_TAGS = ("p", "li")
+_BLOCK_TAGS = ("p", "li", "table", "div", "ul", "ol", "h1", "h2", "h3", "h4")
+_NOTE_CLASSES = ("note", "important", "tip", "info", "warning")
+_SKIP_HEADINGS = frozenset({"Popular Articles", "Popular Guides", "Popular Article"})
+
+
+def _first(nodes):
+    return nodes[0] if nodes else None
+
+
+def extract_page_content(tree: lxml.html.HtmlElement, url: str, category: str) -> dict:
     """Extract structured content from a DBS support article page."""
 
+    # Strip chrome/noise in place before any text extraction
+    etree.strip_elements(
+        tree, "nav", "footer", "header", "script", "style", "noscript", with_tail=False
+    )
+
     # ── Title ──
     title = ""
-    h1 = soup.find("h1")
-    if h1:
-        title = clean_text(h1.get_text())
-    elif soup.find("title"):
-        title = clean_text(soup.find("title").get_text()).replace(" | DBS Singapore", "")
+    h1 = tree.find(".//h1")
+    if h1 is not None:
+        title = clean_text(h1.text_content())
+    else:
+        title_el = tree.find(".//title")
+        if title_el is not None:
+            title = clean_text(title_el.text_content()).replace(" | DBS Singapore", "")
 
     # ── Main content area ──
-    main = (
-        soup.find("div", class_=re.compile(r"(article|content|main-body|ps3-revamp)", re.I))
-        or soup.find("main")
-        or soup.find("div", id=re.compile(r"(content|article)", re.I))
-        or soup.body
-    )
-
-    # ── Extract step-by-step instructions ──
+    # First non-None candidate wins. No `or`-chaining here: truth-testing an
+    # lxml element warns and treats childless matches as falsy.
+    main = _first(_MAIN_CLASS_XPATH(tree))
+    if main is None:
+        main = tree.find(".//main")
+    if main is None:
+        main = _first(_MAIN_ID_XPATH(tree))
+    if main is None:
+        main = tree.find(".//body")
+    if main is None:
+        main = tree
+
+    # ── Steps, FAQ pairs, sections and notes in a single fused pass ──
+    # One depth-first walk classifies each element once instead of four
+    # separate tree scans; headings and questions act as state boundaries.
     steps = []
-    step_elements = soup.find_all(string=re.compile(r"^Step \d+", re.I))
-    for step_el in step_elements:
-        parent = step_el.parent if step_el.parent else step_el
-        step_text = clean_text(parent.get_text() if hasattr(parent, "get_text") else str(parent))
-        if step_text and len(step_text) > 5:
-            steps.append(step_text)
-
-    # ── Extract Q&A / FAQ pairs ──
     faq_pairs = []
-    for strong in soup.find_all(["strong", "b", "h3", "h4"]):
-        text = clean_text(strong.get_text())
-        if text.endswith("?") and len(text) > 10:
-            answer_parts = []
-            sibling = strong.parent.find_next_sibling() if strong.parent else strong.find_next_sibling()
-            while sibling and sibling.name not in ["h1", "h2", "h3", "h4"]:
-                sib_text = clean_text(sibling.get_text())
-                if not sib_text:
-                    break
-                if sib_text.endswith("?") and len(sib_text) > 10:
-                    break
-                answer_parts.append(sib_text)
-                sibling = sibling.find_next_sibling()
-                if len(answer_parts) >= 5:
-                    break
-            if answer_parts:
-                faq_pairs.append({
-                    "question": text,
-                    "answer": " ".join(answer_parts),
-                })
-
-    # ── Extract sections by headings ──
     sections = []
-    for heading in soup.find_all(["h2", "h3"]):
-        heading_text = clean_text(heading.get_text())
-        if not heading_text or heading_text in [
-            "Popular Articles", "Popular Guides", "Popular Article",
-        ]:
-            continue
-        content_parts = []
-        sibling = heading.find_next_sibling()
-        while sibling and sibling.name not in ["h2", "h3"]:
-            text = clean_text(sibling.get_text())
-            if text and len(text) > 3:
-                content_parts.append(text)
-            sibling = sibling.find_next_sibling()
-        if content_parts:
+    notes = []
+    current_faq = None       # {"question": str, "parts": [str]}
+    current_section = None   # {"heading": str, "parts": [str]}
+
+    def flush_faq():
+        nonlocal current_faq
+        if current_faq is not None and current_faq["parts"]:
+            faq_pairs.append({
+                "question": current_faq["question"],
+                "answer": " ".join(current_faq["parts"]),
+            })
+        current_faq = None
+
+    def flush_section():
+        nonlocal current_section
+        if current_section is not None and current_section["parts"]:
             sections.append({
-                "heading": heading_text,
-                "content": " ".join(content_parts),
+                "heading": current_section["heading"],
+                "content": " ".join(current_section["parts"]),
             })
+        current_section = None
+
+    for el in tree.iter():
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue  # comments / processing instructions
+
+        el_class = el.get("class") or ""
+        if el_class and any(key in el_class for key in _NOTE_CLASSES):
+            note_text = clean_text(el.text_content())
+            if len(note_text) > 10:
+                notes.append(note_text)
+
+        if tag in _QUESTION_TAGS:
+            text = clean_text(el.text_content())
+            if text.endswith("?") and len(text) > 10:
+                flush_faq()
+                current_faq = {"question": text, "parts": []}
+                if tag in ("h3", "h4"):
+                    flush_section()
+                continue
+            if tag in ("h3", "h4"):
+                flush_faq()
+                flush_section()
+                if text and text not in _SKIP_HEADINGS and tag == "h3":
+                    current_section = {"heading": text, "parts": []}
+                continue
+            # non-question <strong>/<b>: plain inline emphasis, fall through
+
+        elif tag in ("h1", "h2"):
+            flush_faq()
+            flush_section()
+            if tag == "h2":
+                text = clean_text(el.text_content())
+                if text and text not in _SKIP_HEADINGS:
+                    current_section = {"heading": text, "parts": []}
+            continue
 
-    # ── Full text extraction (fallback) ──
-    full_text = ""
-    if main:
-        for tag in main.find_all(["nav", "footer", "header", "script", "style", "noscript"]):
-            tag.decompose()
-        full_text = clean_text(main.get_text())
+        if el.text and _STEP_RE.match(el.text.strip()):
+            step_text = clean_text(el.text_content())
+            if len(step_text) > 5:
+                steps.append(step_text)
+
+        # Content elements: paragraphs and list items, plus tables (fee
+        # schedules etc.) taken whole, plus leaf-level divs whose text would
+        # otherwise belong to no block element. An element nested inside
+        # another content element is skipped — the enclosing element's
+        # text_content() already covers it (nested lists, <p> inside <li>,
+        # anything inside a table).
+        if (
+            tag == "table"
+            or tag in _CONTENT_TAGS
+            or (tag == "div" and next(el.iterdescendants(*_BLOCK_TAGS), None) is None)
+        ) and next(el.iterancestors("p", "li", "table"), None) is None:
+            content = clean_text(el.text_content())
+        else:
+            content = ""
+
+        if content:
+            if current_faq is not None:
+                if content.endswith("?") and len(content) > 10:
+                    # Question-looking text closes the open answer — it is
+                    # usually the paragraph wrapping the next question
+                    flush_faq()
+                elif len(current_faq["parts"]) < 5:
+                    current_faq["parts"].append(content)
+            if current_section is not None and len(content) > 3:
+                current_section["parts"].append(content)
+
+    flush_faq()
+    flush_section()
 
-    # ── Important notes / tips ──
-    notes = []
-    for note in soup.find_all(class_=re.compile(r"(note|important|tip|info|warning)", re.I)):
-        note_text = clean_text(note.get_text())
-        if note_text and len(note_text) > 10:
-            notes.append(note_text)
+    # ── Full text extraction (fallback) ──
+    # Bounded accumulator: stop walking text nodes once the cap is reached
+    # instead of materializing and cleaning the whole body first
+    full_parts = []
+    total_len = 0
+    if main is not None:
+        for fragment in main.itertext():
+            fragment = clean_text(fragment)
+            if not fragment:
+                continue
+            full_parts.append(fragment)
+            total_len += len(fragment) + 1
+            if total_len >= FULL_TEXT_LIMIT:
+                break
+    full_text = " ".join(full_parts)[:FULL_TEXT_LIMIT]
 
     return {
         "url": url,
         "title": title,
         "category": category,
-        "full_text": full_text[:15000],
+        "full_text": full_text,
         "steps": steps,
         "faq_pairs": faq_pairs,
         "sections": sections,
@@ -547,10 +673,113 @@ def extract_page_content(soup: BeautifulSoup, url: str, category: str) -> dict:
     }
 
 
-def scrape_all():
+# One parser instance per worker process — avoids re-creating libxml2 parser
+# state for each of the ~340 pages
+_HTML_PARSER = lxml.html.HTMLParser()
+
+
+def extract_page_content_raw(html: bytes, url: str, category: str) -> dict:
+    """Process-pool entry point: parse raw HTML bytes and extract content.
+
+    Bytes go straight to libxml2, which reads the charset from the
+    ``<meta charset>`` declaration (DBS pages declare UTF-8) in C — no
+    decode/re-encode round trip in Python first.
+    """
+    try:
+        tree = lxml.html.fromstring(html, parser=_HTML_PARSER)
+    except etree.ParserError:
+        # Rare malformed pages: let BeautifulSoup repair the markup first
+        tree = lxml.html.fromstring(str(BeautifulSoup(html, "lxml")))
+    return extract_page_content(tree, url, category)
+
+
+async def fetch_article(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    limiter: AsyncLimiter,
+    executor: ProcessPoolExecutor,
+    jsonl_file,
+    url: str,
+    category: str,
+) -> dict | None:
+    """Fetch one article page and extract its structured content.
+
+    Fetched HTML is cached on disk keyed by URL; re-runs send a conditional
+    GET and reuse the cached copy on 304, so unchanged pages cost one header
+    round trip instead of a full download.
+    """
+    cache_path = CACHE_DIR / (hashlib.sha1(url.encode()).hexdigest() + ".html")
+    request_headers = {}
+    if cache_path.exists():
+        request_headers["If-Modified-Since"] = formatdate(cache_path.stat().st_mtime, usegmt=True)
+
+    async with semaphore:
+        # Adaptive backoff: full speed while the server is healthy, yield
+        # only when it pushes back with 429/503 — honor its Retry-After if
+        # given, else exponential backoff with jitter
+        html = None
+        for attempt in range(5):
+            delay = None
+            async with limiter:
+                async with client.stream("GET", url, headers=request_headers) as response:
+                    if response.status_code in (429, 503):
+                        retry_after = response.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            delay = int(retry_after)
+                        else:
+                            delay = min(60, 2 ** attempt + random.random())
+                    elif response.status_code == 304:
+                        html = cache_path.read_bytes()
+                    else:
+                        response.raise_for_status()
+
+                        content_type = response.headers.get("Content-Type", "")
+                        if "text/html" not in content_type:
+                            logger.warning(f"Skipped (not HTML): {url} ({content_type})")
+                            return None
+
+                        # Read the body in 8 KiB chunks as it arrives — the
+                        # coroutine yields between chunks so other fetches
+                        # progress during the download. Raw bytes only: the
+                        # parser detects the charset itself.
+                        buf = bytearray()
+                        async for chunk in response.aiter_bytes(8192):
+                            buf.extend(chunk)
+                        html = bytes(buf)
+                        cache_path.write_bytes(html)
+            if delay is None or attempt == 4:
+                # Success, non-retryable status, or retries exhausted —
+                # sleeping after the last attempt would buy nothing
+                break
+            logger.warning(f"HTTP {response.status_code} on {url}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        if html is None:
+            # Retries exhausted on 429/503 — surface it like any other error
+            response.raise_for_status()
+
+    # Parsing and extraction are CPU-bound (libxml2 plus the fused Python
+    # walk) — run them in a worker process so pages parse in parallel while
+    # other fetches proceed.
+    loop = asyncio.get_running_loop()
+    page_data = await loop.run_in_executor(executor, extract_page_content_raw, html, url, category)
+
+    # Append to the JSONL log as soon as the page is done — a crashed or
+    # interrupted run keeps everything scraped so far. Safe without a lock:
+    # writes happen one at a time on the event-loop thread.
+    if orjson is not None:
+        line = orjson.dumps(page_data)
+    else:
+        line = json.dumps(page_data, ensure_ascii=False).encode()
+    jsonl_file.write(line + b"\n")
+
+    logger.info(f"OK: {page_data['title'][:60]}")
+    return page_data
+
+
+async def scrape_all():
     """Main scraping function."""
-    session = requests.Session()
-    session.headers.update({
+    headers = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -558,48 +787,62 @@ def scrape_all():
         ),
         "Accept": "text/html,application/xhtml+xml",
         "Accept-Language": "en-US,en;q=0.9",
-    })
-
-    # Deduplicate URLs across categories
-    all_urls = {}
-    for category, urls in ARTICLES.items():
-        for url_path in urls:
-            full_url = BASE_URL + url_path
-            if full_url not in all_urls:
-                all_urls[full_url] = category
+        "Accept-Encoding": "gzip, br",
+    }
 
-    total = len(all_urls)
-    logger.info(f"Starting scrape of {total} unique article pages...")
+    total = len(ALL_URLS)
+    logger.info(f"Starting scrape of {total} unique article pages "
+                f"({MAX_CONCURRENCY} concurrent, {MAX_REQUESTS_PER_SEC}/s)...")
+
+    # The scrape is network-bound: a bounded number of requests stay in flight
+    # while a token bucket caps the steady-state rate, replacing the old fixed
+    # per-request sleep.
+    CACHE_DIR.mkdir(exist_ok=True)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    limiter = AsyncLimiter(MAX_REQUESTS_PER_SEC, 1)
+    # Single host: HTTP/2 multiplexes the requests over a few keep-alive
+    # connections instead of one TLS handshake per request. Keep-alive expiry
+    # comfortably outlives the limiter's gaps so sockets are reused for the
+    # whole run, and the transport retries connect-level failures (DNS, reset
+    # sockets) before they surface as errors.
+    limits = httpx.Limits(
+        max_connections=MAX_CONCURRENCY,
+        max_keepalive_connections=MAX_CONCURRENCY,
+        keepalive_expiry=60,
+    )
+    transport = httpx.AsyncHTTPTransport(http2=True, limits=limits, retries=3)
+
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            open("dbs_knowledge_base.jsonl", "wb") as jsonl_file:
+        async with httpx.AsyncClient(
+            transport=transport,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+        ) as client:
+            tasks = [
+                fetch_article(client, semaphore, limiter, executor, jsonl_file, url, category)
+                for url, category in ALL_URLS
+            ]
+            pages = await asyncio.gather(*tasks, return_exceptions=True)
 
     results = []
     failed = []
-
-    for i, (url, category) in enumerate(all_urls.items(), 1):
-        logger.info(f"[{i}/{total}] Scraping: {url}")
-
-        try:
-            response = session.get(url, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-
-            content_type = response.headers.get("Content-Type", "")
-            if "text/html" not in content_type:
-                logger.warning(f"  Skipped (not HTML): {content_type}")
-                continue
-
-            soup = BeautifulSoup(response.text, "lxml")
-            page_data = extract_page_content(soup, url, category)
-            results.append(page_data)
-            logger.info(f"  OK: {page_data['title'][:60]}")
-
-        except requests.RequestException as e:
-            logger.warning(f"  FAIL: {e}")
-            failed.append({"url": url, "category": category, "error": str(e)})
-
-        time.sleep(REQUEST_DELAY)
+    for (url, category), page in zip(ALL_URLS, pages):
+        if isinstance(page, BaseException):
+            logger.warning(f"FAIL: {url}: {page}")
+            failed.append({"url": url, "category": category, "error": str(page)})
+        elif page is not None:
+            results.append(page)
 
     # ── Save results ──
-    with open("dbs_knowledge_base.json", "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    # The JSON array form is what dbs_ingest.py consumes; orjson serializes
+    # it in one C pass (UTF-8, unescaped, like ensure_ascii=False)
+    with open("dbs_knowledge_base.json", "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+        else:
+            f.write(json.dumps(results, indent=2, ensure_ascii=False).encode())
     logger.info(f"\nSaved {len(results)} articles to dbs_knowledge_base.json")
 
     stats = {
@@ -632,4 +875,4 @@ def scrape_all():
 
 
 if __name__ == "__main__":
-    scrape_all()
+    asyncio.run(scrape_all())